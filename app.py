@@ -1,192 +1,18 @@
-import os
-import re
-import json
-from datetime import datetime, date, timedelta
-from typing import Dict, Any, Optional
-from pathlib import Path
-from io import BytesIO
+from datetime import date, timedelta
 
 import streamlit as st
-import requests
-from dotenv import load_dotenv
-from openai import OpenAI
-from tavily import TavilyClient
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
-from reportlab.lib.units import inch
-
-# ================================
-# Load Environment Variables
-# ================================
 
+# core is imported once per server process, so Streamlit reruns of this script
+# do not repeat client setup or environment loading
 try:
-    script_dir = Path(__file__).parent if '__file__' in globals() else Path.cwd()
-
-    # Load environment variables
-    load_dotenv(script_dir / "TAVILY_API_KEY.env")
-    load_dotenv(script_dir / "OPENAI_API_KEY.env")
-    load_dotenv(script_dir / "PEXELS_API_KEY.env")
-
-    TAVILY_KEY = os.getenv("TAVILY_API_KEY")
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    PEXELS_KEY = os.getenv("PEXELS_API_KEY")
-
-    # Validate API keys
-    required_keys = [
-        (TAVILY_KEY, "TAVILY_API_KEY"),
-        (OPENAI_API_KEY, "OPENAI_API_KEY"),
-    ]
-
-    missing_keys = [name for key, name in required_keys if not key]
-
-    if missing_keys:
-        st.error(f"Missing API keys: {', '.join(missing_keys)}. Please check your .env files.")
-        st.info(f"Looking for .env files in: {script_dir}")
-        st.stop()
-
-    # Pexels is optional
-    if not PEXELS_KEY:
-        st.warning("PEXELS_API_KEY not found. Images will not be displayed.")
-
-    # ================================
-    # Initialize Clients
-    # ================================
-
-    tavily_client = TavilyClient(api_key=TAVILY_KEY)
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
-    
+    from core import PEXELS_KEY, is_valid_destination, run_async, iter_async, prepare, generate_trip_plan, generate_pdf
 except Exception as e:
     st.error(f"Initialization error: {str(e)}")
     st.stop()
 
-# ================================
-# Helper Functions
-# ================================
-def get_destination_image(destination: str) -> Optional[str]:
-    """Fetch image URL from Pexels API"""
-    if not PEXELS_KEY:
-        return None
-    try:
-        url = f"https://api.pexels.com/v1/search?query={destination} travel&per_page=1"
-        headers = {"Authorization": PEXELS_KEY}
-        response = requests.get(url, headers=headers, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('photos'):
-                return data['photos'][0]['src']['large']
-    except Exception:
-        pass
-    return None
-
-def download_image(image_url: str) -> Optional[BytesIO]:
-    try:
-        response = requests.get(image_url, timeout=10)
-        if response.status_code == 200:
-            return BytesIO(response.content)
-    except Exception:
-        pass
-    return None
-
-def normalize_price(text: str) -> Optional[float]:
-    match = re.search(r"\$([\d,]+)", str(text))
-    return float(match.group(1).replace(",", "")) if match else None
-
-def search_travel_info(destination: str, departure: str = "San Francisco",
-                       start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, list]:
-    results: dict = {"flights": [], "hotels": [], "cars": [], "pois": []}
-
-    # Flights
-    flight_results = tavily_client.search(f"Flights from {departure} to {destination} {start_date or ''} to {end_date or ''}", search_depth="advanced")
-    for r in flight_results.get("results", [])[:3]:
-        results["flights"].append({
-            "name": r.get("title", "Unknown"),
-            "url": r.get("url", ""),
-            "snippet": r.get("content", ""),
-            "price": normalize_price(r.get("content", ""))
-        })
-
-    # Hotels
-    hotel_results = tavily_client.search(f"Hotels in {destination} {start_date or ''} to {end_date or ''}", search_depth="advanced")
-    for r in hotel_results.get("results", [])[:3]:
-        results["hotels"].append({
-            "name": r.get("title", "Unknown"),
-            "url": r.get("url", ""),
-            "snippet": r.get("content", ""),
-            "price": normalize_price(r.get("content", ""))
-        })
-
-    # Cars
-    car_results = tavily_client.search(f"Car rentals in {destination}", search_depth="advanced")
-    for r in car_results.get("results", [])[:3]:
-        results["cars"].append({
-            "name": r.get("title", "Unknown"),
-            "url": r.get("url", ""),
-            "snippet": r.get("content", "")
-        })
-
-    # Attractions
-    poi_results = tavily_client.search(f"Top attractions in {destination}", search_depth="advanced")
-    for r in poi_results.get("results", [])[:5]:
-        results["pois"].append({
-            "name": r.get("title", "Unknown"),
-            "url": r.get("url", ""),
-            "snippet": r.get("content", "")
-        })
-
-    return results
-
-def generate_trip_plan(trip_details: dict, search_results: dict) -> str:
-    prompt = f"""
-    Create a detailed trip plan for a {trip_details.get('duration_nights')} night trip using:
-    TRIP DETAILS:
-    {json.dumps(trip_details, indent=2)}
-    SEARCH RESULTS:
-    {json.dumps(search_results, indent=2, default=str)}
-
-    Structure it by day (Day 1, Day 2, etc.) and include an Overview, Flights, Hotels, Cars, Attractions, Budget, and Tips.
-    Use markdown-style headings.
-    """
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-        max_tokens=2500
-    )
-    return response.choices[0].message.content
-
-def generate_pdf(trip_details: dict, trip_plan: str, image_bytes: Optional[BytesIO] = None) -> BytesIO:
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    elements = [Paragraph(f"Travel Itinerary: {trip_details.get('destination')}", styles['Title'])]
-
-    if image_bytes:
-        elements.append(RLImage(image_bytes, width=5*inch, height=3*inch))
-
-    elements.append(Spacer(1, 12))
-    details = f"""
-    <b>From:</b> {trip_details.get('departure_city')}<br/>
-    <b>Dates:</b> {trip_details.get('start_date')} - {trip_details.get('end_date')}<br/>
-    <b>Duration:</b> {trip_details.get('duration_nights')} nights<br/>
-    <b>Travelers:</b> {trip_details.get('travelers')}<br/>
-    <b>Budget:</b> {trip_details.get('budget')}<br/>
-    """
-    elements.append(Paragraph(details, styles['Normal']))
-    elements.append(Spacer(1, 12))
-
-    for line in trip_plan.splitlines():
-        if line.startswith("##"):
-            elements.append(Paragraph(line.replace("##", ""), styles['Heading2']))
-        elif line.startswith("- "):
-            elements.append(Paragraph("• " + line[2:], styles['Normal']))
-        else:
-            elements.append(Paragraph(line, styles['Normal']))
-        elements.append(Spacer(1, 6))
-
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+# Pexels is optional
+if not PEXELS_KEY:
+    st.warning("PEXELS_API_KEY not found. Images will not be displayed.")
 
 # ================================
 # Streamlit UI
@@ -267,7 +93,7 @@ def main():
                 st.markdown("<br>", unsafe_allow_html=True)
                 
                 if st.button("Next ➡️", use_container_width=True):
-                    if not destination or end_date <= start_date:
+                    if not is_valid_destination(destination) or end_date <= start_date:
                         st.error("Please enter a valid destination and date range.")
                     else:
                         st.session_state.form_data['destination'] = destination
@@ -363,48 +189,43 @@ def main():
                     }
 
                     with st.spinner("Generating itinerary..."):
-                        image_url = get_destination_image(trip_details['destination'])
-                        image_bytes = download_image(image_url) if image_url else None
-                        search_results = search_travel_info(trip_details['destination'], 
-                                                          trip_details['departure_city'],
-                                                          trip_details['start_date'], 
-                                                          trip_details['end_date'])
-                        trip_plan = generate_trip_plan(trip_details, search_results)
-                        
-                        st.subheader("🗺️ Your Travel Itinerary")
-                        if image_url:
-                            st.markdown(f"""
-                                <div style="
-                                    border: 8px solid #0066CC;
-                                    border-radius: 15px;
-                                    box-shadow: 0 8px 16px rgba(0,0,0,0.3);
-                                    padding: 10px;
-                                    background: white;
-                                    max-width: 100%;
-                                    margin: 20px auto;
+                        image_url, image_future, search_results, embedding = run_async(prepare(trip_details))
+                    
+                    st.subheader("🗺️ Your Travel Itinerary")
+                    if image_url:
+                        st.markdown(f"""
+                            <div style="
+                                border: 8px solid #0066CC;
+                                border-radius: 15px;
+                                box-shadow: 0 8px 16px rgba(0,0,0,0.3);
+                                padding: 10px;
+                                background: white;
+                                max-width: 100%;
+                                margin: 20px auto;
+                            ">
+                                <img src="{image_url}" style="
+                                    width: 100%;
+                                    border-radius: 8px;
+                                    display: block;
                                 ">
-                                    <img src="{image_url}" style="
-                                        width: 100%;
-                                        border-radius: 8px;
-                                        display: block;
-                                    ">
-                                </div>
-                            """, unsafe_allow_html=True)
-                        else:
-                            st.info("No image available for this destination")
-                        
-                        st.markdown(trip_plan)
-                        
-                        pdf_buffer = generate_pdf(trip_details, trip_plan, image_bytes)
-                        st.download_button("📥 Download Itinerary as PDF", pdf_buffer,
-                                         file_name=f"{trip_details['destination'].replace(', ', '_')}_itinerary.pdf",
-                                         mime="application/pdf")
-                        
-                        # Add button to start over
-                        if st.button("✨ Plan Another Trip"):
-                            st.session_state.page = 1
-                            st.session_state.form_data = {}
-                            st.rerun()
+                            </div>
+                        """, unsafe_allow_html=True)
+                    else:
+                        st.info("No image available for this destination")
+                    
+                    trip_plan = st.write_stream(iter_async(generate_trip_plan(trip_details, search_results, embedding)))
+                    
+                    image_bytes = image_future.result() if image_future else None
+                    pdf_buffer = generate_pdf(trip_details, trip_plan, image_bytes)
+                    st.download_button("📥 Download Itinerary as PDF", pdf_buffer,
+                                     file_name=f"{trip_details['destination'].replace(', ', '_')}_itinerary.pdf",
+                                     mime="application/pdf")
+                    
+                    # Add button to start over
+                    if st.button("✨ Plan Another Trip"):
+                        st.session_state.page = 1
+                        st.session_state.form_data = {}
+                        st.rerun()
 
 
 if __name__ == "__main__":
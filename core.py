@@ -0,0 +1,392 @@
+"""Backend for the travel planner: API clients, travel search, trip-plan generation and PDF export.
+
+Frontend-agnostic: clients, the event loop and caches are plain module-level
+singletons that live as long as the process (Streamlit imports this module once).
+"""
+
+import os
+import re
+import asyncio
+import atexit
+import threading
+import time
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, AsyncIterator, Iterator
+from pathlib import Path
+from io import BytesIO
+
+import numpy as np
+import orjson
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from tavily import TavilyClient
+
+# ================================
+# Async Runtime
+# ================================
+
+def run_async(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+def iter_async(agen: AsyncIterator) -> Iterator:
+    """Drive an async generator on the background loop, yielding its items synchronously"""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(agen.__anext__(), _loop).result()
+        except StopAsyncIteration:
+            return
+
+def async_lru_cache(maxsize: int, ttl: Optional[float] = None):
+    """LRU cache for coroutine functions, keyed by positional args; None results are not cached.
+
+    With `ttl`, entries expire that many seconds after insertion. Needs no locking
+    because every coroutine runs on the one background loop.
+    """
+    def decorator(func):
+        cache: OrderedDict = OrderedDict()  # args -> (expires_at, value)
+
+        @functools.wraps(func)
+        async def wrapper(*args):
+            entry = cache.get(args)
+            if entry and (ttl is None or entry[0] > time.monotonic()):
+                cache.move_to_end(args)
+                return entry[1]
+            value = await func(*args)
+            if value is not None:
+                cache[args] = (time.monotonic() + ttl if ttl is not None else None, value)
+                cache.move_to_end(args)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+        return wrapper
+    return decorator
+
+# ================================
+# Semantic Cache
+# ================================
+
+class SemanticCache:
+    """In-memory plan cache: exact hits by (key, text), near-duplicates by cosine similarity of text embeddings"""
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, maxsize: int = 256):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # (key, text) -> (expires_at, embedding, completion), oldest first
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str, text: str) -> Optional[str]:
+        entry = self._entries.get((key, text))
+        return entry[2] if entry and entry[0] > time.monotonic() else None
+
+    def lookup(self, key: str, embedding: np.ndarray) -> Optional[str]:
+        now = time.monotonic()
+        candidates = [e for (k, _), e in self._entries.items() if k == key and e[0] > now and e[1] is not None]
+        if not candidates:
+            return None
+        scores = np.stack([e[1] for e in candidates]) @ embedding
+        best = int(np.argmax(scores))
+        return candidates[best][2] if scores[best] > self.threshold else None
+
+    def insert(self, key: str, text: str, embedding: Optional[np.ndarray], completion: str) -> None:
+        now = time.monotonic()
+        self._entries[(key, text)] = (now + self.ttl, embedding, completion)
+        self._entries.move_to_end((key, text))
+        # Every entry shares one TTL, so expired entries are always at the front
+        while self._entries and (len(self._entries) > self.maxsize or next(iter(self._entries.values()))[0] <= now):
+            self._entries.popitem(last=False)
+
+# ================================
+# Load Environment Variables
+# ================================
+
+script_dir = Path(__file__).parent
+
+# Load environment variables
+load_dotenv(script_dir / "TAVILY_API_KEY.env")
+load_dotenv(script_dir / "OPENAI_API_KEY.env")
+load_dotenv(script_dir / "PEXELS_API_KEY.env")
+
+TAVILY_KEY = os.getenv("TAVILY_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+PEXELS_KEY = os.getenv("PEXELS_API_KEY")
+
+# Validate API keys (Pexels is optional)
+required_keys = [
+    (TAVILY_KEY, "TAVILY_API_KEY"),
+    (OPENAI_API_KEY, "OPENAI_API_KEY"),
+]
+
+missing_keys = [name for key, name in required_keys if not key]
+
+if missing_keys:
+    raise RuntimeError(f"Missing API keys: {', '.join(missing_keys)}. "
+                       f"Please check your .env files in {script_dir}.")
+
+# ================================
+# Initialize Clients
+# ================================
+
+# One loop for the whole process, so pooled async connections stay usable across requests
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, daemon=True).start()
+
+tavily_client = TavilyClient(api_key=TAVILY_KEY)
+http_client = httpx.AsyncClient(http2=True, limits=httpx.Limits(max_keepalive_connections=32))
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+atexit.register(lambda: asyncio.run_coroutine_threadsafe(http_client.aclose(), _loop).result(timeout=5))
+plan_cache = SemanticCache()
+pexels_headers = {"Authorization": PEXELS_KEY or ""}
+
+# ================================
+# Helper Functions
+# ================================
+@async_lru_cache(maxsize=256)
+async def _pexels_url(destination: str) -> Optional[str]:
+    try:
+        response = await http_client.get("https://api.pexels.com/v1/search",
+                                         params={"query": f"{destination} travel", "per_page": 1},
+                                         headers=pexels_headers, timeout=5)
+        if response.status_code == 200:
+            data = orjson.loads(response.content)
+            if data.get('photos'):
+                return data['photos'][0]['src']['large']
+    except Exception:
+        pass
+    return None
+
+async def get_destination_image(destination: str) -> Optional[str]:
+    """Fetch image URL from Pexels API"""
+    if not PEXELS_KEY:
+        return None
+    return await _pexels_url(destination.strip().lower())
+
+@async_lru_cache(maxsize=128)
+async def _download_bytes(image_url: str) -> Optional[bytes]:
+    try:
+        response = await http_client.get(image_url, timeout=10)
+        if response.status_code == 200:
+            return response.content
+    except Exception:
+        pass
+    return None
+
+async def download_image(image_url: str) -> Optional[BytesIO]:
+    # Cache raw bytes; a BytesIO is consumed by whoever reads it
+    content = await _download_bytes(image_url)
+    return BytesIO(content) if content else None
+
+_DESTINATION_RE = re.compile(r"[^\W\d_]{2,}")
+
+def is_valid_destination(destination: str) -> bool:
+    """Cheap check that the destination looks like a place name, before any API is called"""
+    return bool(_DESTINATION_RE.search(destination or ""))
+
+_PRICE_RE = re.compile(r"\$([\d,]+)")
+
+def normalize_price(text: str) -> Optional[float]:
+    match = _PRICE_RE.search(text if isinstance(text, str) else str(text))
+    return float(match.group(1).replace(",", "")) if match else None
+
+@dataclass(slots=True)
+class Hit:
+    name: str
+    url: str
+    snippet: str
+    price: Optional[float] = None
+
+def _prompt_default(obj):
+    """orjson fallback for the planner prompt: Hits without empty fields, anything else as str"""
+    if isinstance(obj, Hit):
+        return {field: value for field in Hit.__slots__ if (value := getattr(obj, field)) is not None}
+    return str(obj)
+
+def _to_hits(response: dict, limit: int, priced: bool = False) -> list:
+    return [Hit(r.get("title", "Unknown"), r.get("url", ""), (content := r.get("content", ""))[:200],
+                normalize_price(content) if priced else None)
+            for r in response.get("results", [])[:limit]]
+
+@async_lru_cache(maxsize=512, ttl=3600)
+async def _tavily_search(query: str, depth: str, max_results: int) -> dict:
+    """Tavily search, cached for an hour per query"""
+    # TavilyClient is synchronous, so the request runs in a worker thread
+    return await asyncio.to_thread(tavily_client.search, query, search_depth=depth, max_results=max_results)
+
+async def search_travel_info(destination: str, departure: str = "San Francisco",
+                             start_date: Optional[str] = None, end_date: Optional[str] = None,
+                             depth: str = "basic") -> Dict[str, list]:
+    # All four searches are awaited together
+    flight_results, hotel_results, car_results, poi_results = await asyncio.gather(
+        _tavily_search(f"Flights from {departure} to {destination} {start_date or ''} to {end_date or ''}", depth, 3),
+        _tavily_search(f"Hotels in {destination} {start_date or ''} to {end_date or ''}", depth, 3),
+        _tavily_search(f"Car rentals in {destination}", depth, 3),
+        _tavily_search(f"Top attractions in {destination}", depth, 5),
+    )
+
+    return {
+        "flights": _to_hits(flight_results, 3, priced=True),
+        "hotels": _to_hits(hotel_results, 3, priced=True),
+        "cars": _to_hits(car_results, 3),
+        "pois": _to_hits(poi_results, 5),
+    }
+
+async def prepare(trip_details: dict):
+    """Fetch the destination image URL, travel search results and plan-cache embedding concurrently.
+
+    The image download is started as soon as its URL is known and returned as a
+    concurrent Future, so it can overlap trip-plan generation; only the PDF needs it.
+    """
+    async def fetch_image():
+        image_url = await get_destination_image(trip_details['destination'])
+        image_future = asyncio.run_coroutine_threadsafe(download_image(image_url), asyncio.get_running_loop()) if image_url else None
+        return image_url, image_future
+
+    (image_url, image_future), search_results, embedding = await asyncio.gather(
+        fetch_image(),
+        search_travel_info(trip_details['destination'],
+                           trip_details['departure_city'],
+                           trip_details['start_date'],
+                           trip_details['end_date']),
+        destination_embedding(trip_details),
+    )
+    return image_url, image_future, search_results, embedding
+
+# Static part of the planner prompt, built once at import
+_PLAN_INSTRUCTIONS = (
+    "Structure it by day (Day 1, Day 2, etc.) and include an Overview, Flights, Hotels, Cars, Attractions, Budget, and Tips.\n"
+    "Use markdown-style headings."
+)
+
+async def embed_text(text: str) -> np.ndarray:
+    response = await openai_client.embeddings.create(model="text-embedding-3-small", input=text)
+    embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+def plan_cache_key(trip_details: dict) -> Tuple[str, str]:
+    """Split trip details into the exact-match cache key and the normalized destination.
+
+    Dates, budget and preferences must match exactly; only the free-text destination
+    is compared semantically.
+    """
+    key = orjson.dumps({k: v for k, v in trip_details.items() if k != 'destination'},
+                       option=orjson.OPT_SORT_KEYS, default=str).decode()
+    return key, str(trip_details.get('destination', '')).strip().lower()
+
+async def destination_embedding(trip_details: dict) -> Optional[np.ndarray]:
+    """Embedding for semantic plan-cache lookups.
+
+    None when an exact cached plan already exists, or when the embeddings call fails;
+    the cache is optional, so planning then continues without it.
+    """
+    key, destination = plan_cache_key(trip_details)
+    if plan_cache.get(key, destination) is not None:
+        return None
+    try:
+        return await embed_text(destination)
+    except Exception:
+        return None
+
+async def generate_trip_plan(trip_details: dict, search_results: dict,
+                             embedding: Optional[np.ndarray] = None) -> AsyncIterator[str]:
+    """Stream the trip plan as it is generated.
+
+    `embedding` comes from destination_embedding(), computed in prepare() so the
+    plan cache adds no round trip here.
+    """
+    cache_key, destination = plan_cache_key(trip_details)
+    try:
+        cached_plan = plan_cache.get(cache_key, destination)
+        if cached_plan is None and embedding is not None:
+            cached_plan = plan_cache.lookup(cache_key, embedding)
+    except Exception:
+        cached_plan = None
+    if cached_plan is not None:
+        yield cached_plan
+        return
+
+    # Decode budget scales with trip length; hits with a known price go first
+    nights = trip_details.get('duration_nights') or 5
+    max_tokens = max(600, min(2500, 400 + 300 * nights))
+    ranked_results = {category: sorted(hits, key=lambda hit: hit.price is None)
+                      for category, hits in search_results.items()}
+
+    prompt = (
+        f"Create a detailed trip plan for a {trip_details.get('duration_nights')} night trip using:\n"
+        f"TRIP DETAILS:\n{orjson.dumps({k: v for k, v in trip_details.items() if v}, default=str).decode()}\n"
+        f"SEARCH RESULTS:\n{orjson.dumps(ranked_results, default=_prompt_default, option=orjson.OPT_PASSTHROUGH_DATACLASS).decode()}\n\n"
+        + _PLAN_INSTRUCTIONS
+    )
+    response = await openai_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    parts = []
+    async for chunk in response:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            yield delta
+    if parts:
+        plan_cache.insert(cache_key, destination, embedding, "".join(parts))
+
+_HEADING_RE = re.compile(r"^#{2,}\s*(.*)")
+_BULLET_RE = re.compile(r"^-\s+(.*)")
+
+def generate_pdf(trip_details: dict, trip_plan: str, image_bytes: Optional[BytesIO] = None) -> BytesIO:
+    # reportlab is only needed once a plan exists, so keep it off the startup path
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
+    from reportlab.lib.units import inch
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = [Paragraph(f"Travel Itinerary: {trip_details.get('destination')}", styles['Title'])]
+
+    if image_bytes:
+        elements.append(RLImage(image_bytes, width=5*inch, height=3*inch))
+
+    elements.append(Spacer(1, 12))
+    details = f"""
+    <b>From:</b> {trip_details.get('departure_city')}<br/>
+    <b>Dates:</b> {trip_details.get('start_date')} - {trip_details.get('end_date')}<br/>
+    <b>Duration:</b> {trip_details.get('duration_nights')} nights<br/>
+    <b>Travelers:</b> {trip_details.get('travelers')}<br/>
+    <b>Budget:</b> {trip_details.get('budget')}<br/>
+    """
+    elements.append(Paragraph(details, styles['Normal']))
+    elements.append(Spacer(1, 12))
+
+    # Consecutive bullets share one Paragraph; spacing comes from the style rather than a Spacer per line
+    body_style = ParagraphStyle('Body', parent=styles['Normal'], spaceAfter=6)
+    bullets: list = []
+
+    def flush_bullets():
+        if bullets:
+            elements.append(Paragraph("<br/>".join("• " + b for b in bullets), body_style))
+            bullets.clear()
+
+    for line in trip_plan.splitlines():
+        bullet = _BULLET_RE.match(line)
+        if bullet:
+            bullets.append(bullet.group(1))
+            continue
+        flush_bullets()
+        heading = _HEADING_RE.match(line)
+        if heading:
+            elements.append(Spacer(1, 6))
+            elements.append(Paragraph(heading.group(1), styles['Heading2']))
+        elif line.strip():
+            elements.append(Paragraph(line, body_style))
+    flush_bullets()
+
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer